@@ -0,0 +1,414 @@
+import asyncio
+import functools
+import json
+import logging
+import os
+from dataclasses import dataclass
+from typing import FrozenSet, Iterable, Iterator, List, Optional, Set
+
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import TelegramError, TimedOut
+from telegram.ext import (
+    Application,
+    CommandHandler,
+    ContextTypes,
+    MessageHandler,
+    filters,
+    CallbackQueryHandler,
+    ConversationHandler,
+)
+
+logger = logging.getLogger(__name__)
+
+# Constants for ConversationHandler
+CHOOSING, TYPING_TEXT, WAITING_MEDIA, BROADCAST = range(4)
+
+# Reply texts, all sent with Markdown parse mode
+MESSAGES = {
+    "welcome": (
+        "🌟 *QamQor — сіздің қаржылық көмекшіңіз*\n\n"
+        "Қаржылық сауаттылықты арттыруға, алаяқтардан қорғануға және "
+        "ақшаңызды дұрыс басқаруға көмектеседі. Күн сайын кеңестер мен "
+        "мотивация алыңыз, сұрақтарыңызды қойып, сенімді жауаптар табыңыз."
+    ),
+    "admin_menu": "👨‍💻 *Әкімші панелі*\n\nҚолжетімді әрекеттер:",
+    "broadcast_prompt": (
+        "📢 *Барлық қолданушыларға хабарлау*\n\n"
+        "Жіберілетін хабарлама мәтінін енгізіңіз.\n"
+        "Болдырмау үшін /cancel командасын жіберіңіз."
+    ),
+    "text_saved": (
+        "✅ *Мәтін сақталды*\n\n"
+        "Мәтін: {text}\n\n"
+        "Енді не істейміз?"
+    ),
+    "photo_prompt": "🖼 Хабарламаға қосатын суретті жіберіңіз.",
+    "video_prompt": "🎬 Хабарламаға қосатын видеоны жіберіңіз.",
+    "wrong_media": "❌ Қате формат. Сурет немесе видео жіберіңіз.",
+    "media_saved": (
+        "✅ {media_type} сақталды!\n\n"
+        "Хабарламаны жіберуге дайынсыз ба?"
+    ),
+    "broadcast_failed": "❌ *Хабарламаны жіберу мүмкін болмады*\n\nҚайтадан көріңіз.",
+    "broadcast_started": "📢 *Хабарлама тарату басталды*\n\nКүте тұрыңыз...",
+    "broadcast_progress": (
+        "📢 *Хабарлама таратылуда*\n\n"
+        "Өңделді: {done}/{total}\n"
+        "Жіберілген: {successful}\n"
+        "Жіберілмеген: {failed}"
+    ),
+    "broadcast_done": (
+        "✅ *Хабарлама тарату аяқталды*\n\n"
+        "Жіберілген: {successful}\n"
+        "Жіберілмеген: {failed}"
+    ),
+    "cancelled": "❌ Операция жойылды.",
+}
+
+@dataclass
+class Draft:
+    """Broadcast being composed by an admin, kept in their user_data."""
+    text: str = ""
+    media_type: Optional[str] = None
+    media: Optional[str] = None
+
+# Inline keyboards are immutable, so build them once
+ADMIN_MENU_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📢 Барлық қолданушыларға хабарлау", callback_data="broadcast")]
+])
+MEDIA_CHOICE_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🖼 Сурет қосу", callback_data="add_photo")],
+    [InlineKeyboardButton("🎬 Видео қосу", callback_data="add_video")],
+    [InlineKeyboardButton("▶️ Хабарламаны жіберу", callback_data="send_now")]
+])
+SEND_NOW_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("▶️ Хабарламаны жіберу", callback_data="send_now")]
+])
+
+# Maximum number of concurrent Bot API requests during a broadcast
+BROADCAST_WORKERS = 25
+
+# Recipients scheduled per wave, bounding the number of pending sends
+BROADCAST_CHUNK_SIZE = 500
+
+# The admin's status message is refreshed after this many sends
+BROADCAST_PROGRESS_INTERVAL = 100
+
+def chunks(items: Iterable[int], size: int) -> Iterator[List[int]]:
+    """Lazily split items into lists of at most size elements."""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+USERS_FILE = "users.log"
+
+def load_users() -> Set[int]:
+    """Load the IDs of users who have started the bot."""
+    loaded = set()
+    try:
+        with open(USERS_FILE, "r") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    loaded.add(int(line))
+                except ValueError:
+                    # e.g. an append torn by a crash
+                    logger.warning("Skipping malformed line in %s: %r", USERS_FILE, line)
+    except FileNotFoundError:
+        pass
+    return loaded
+
+def remember_user(user_id: int) -> None:
+    """Record a user, appending to the users file only when first seen."""
+    if user_id in users:
+        return
+    users.add(user_id)
+    with open(USERS_FILE, "a") as f:
+        f.write(f"{user_id}\n")
+
+# Store users who have started the bot
+users = load_users()
+
+ADMINS_FILE = "admins.json"
+
+# Parsed admin IDs together with the modification time they were read at
+_admins_cache = {"mtime": None, "data": frozenset()}
+
+def load_admins() -> FrozenSet[int]:
+    try:
+        with open(ADMINS_FILE, "r") as f:
+            return frozenset(json.load(f))
+    except FileNotFoundError:
+        logger.error("Admin file not found. Creating a new one.")
+        with open(ADMINS_FILE, "w") as f:
+            json.dump([], f)
+        return frozenset()
+
+def get_admins() -> FrozenSet[int]:
+    """Return admin IDs, re-reading the file only when it has changed."""
+    try:
+        mtime = os.path.getmtime(ADMINS_FILE)
+    except OSError:
+        mtime = None
+    if mtime is None or mtime != _admins_cache["mtime"]:
+        try:
+            data = load_admins()
+        except (ValueError, TypeError) as e:
+            # The file may be mid-edit; keep the last good admins and leave
+            # the cached mtime alone so the next call retries
+            logger.error("Admin file is corrupted, keeping the previous admins: %s", e)
+            return _admins_cache["data"]
+        _admins_cache.update(mtime=mtime, data=data)
+    return _admins_cache["data"]
+
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Start command handler."""
+    user_id = update.effective_user.id
+    remember_user(user_id)
+    
+    await update.message.reply_text(MESSAGES["welcome"], parse_mode="Markdown")
+    
+    # If the user is an admin, show admin commands
+    if user_id in get_admins():
+        await send_admin_menu(update, context)
+
+async def send_admin_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Send admin menu with broadcast option."""
+    await update.message.reply_text(
+        MESSAGES["admin_menu"],
+        reply_markup=ADMIN_MENU_MARKUP,
+        parse_mode="Markdown"
+    )
+
+async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Handle button callbacks."""
+    query = update.callback_query
+    await query.answer()
+    
+    if query.data == "broadcast":
+        # Start from a fresh draft so nothing leaks from an earlier broadcast
+        context.user_data["draft"] = Draft()
+        await query.message.reply_text(
+            MESSAGES["broadcast_prompt"],
+            parse_mode="Markdown"
+        )
+        return TYPING_TEXT
+    
+    return ConversationHandler.END
+
+async def text_input(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Handle text input for broadcast."""
+    context.user_data.setdefault("draft", Draft()).text = update.message.text
+    
+    await update.message.reply_text(
+        MESSAGES["text_saved"].format(text=update.message.text),
+        reply_markup=MEDIA_CHOICE_MARKUP,
+        parse_mode="Markdown"
+    )
+    return WAITING_MEDIA
+
+async def _prompt_photo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Ask the admin for the photo to attach."""
+    await update.callback_query.message.reply_text(
+        MESSAGES["photo_prompt"],
+        parse_mode="Markdown"
+    )
+    context.user_data.setdefault("draft", Draft()).media_type = "photo"
+    return BROADCAST
+
+async def _prompt_video(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Ask the admin for the video to attach."""
+    await update.callback_query.message.reply_text(
+        MESSAGES["video_prompt"],
+        parse_mode="Markdown"
+    )
+    context.user_data.setdefault("draft", Draft()).media_type = "video"
+    return BROADCAST
+
+async def media_choice(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Handle media choice for broadcast."""
+    query = update.callback_query
+    await query.answer()
+    
+    handler = MEDIA_HANDLERS.get(query.data)
+    if handler:
+        return await handler(update, context)
+    
+    return WAITING_MEDIA
+
+async def receive_media(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Handle receiving media for broadcast."""
+    draft = context.user_data.setdefault("draft", Draft())
+    if update.message.photo:
+        draft.media = update.message.photo[-1].file_id
+        media_type = "photo"
+    elif update.message.video:
+        draft.media = update.message.video.file_id
+        media_type = "video"
+    else:
+        await update.message.reply_text(
+            MESSAGES["wrong_media"],
+            parse_mode="Markdown"
+        )
+        return BROADCAST
+    
+    draft.media_type = media_type
+    
+    await update.message.reply_text(
+        MESSAGES["media_saved"].format(media_type=media_type.capitalize()),
+        reply_markup=SEND_NOW_MARKUP,
+        parse_mode="Markdown"
+    )
+    return WAITING_MEDIA
+
+async def broadcast_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Broadcast message to all users."""
+    # Get callback query if available
+    query = update.callback_query if hasattr(update, "callback_query") else None
+    
+    # Get the draft being broadcast
+    draft = context.user_data.get("draft", Draft())
+    text, media_type, media = draft.text, draft.media_type, draft.media
+    
+    # "Send" can still be pressed after choosing media but before sending it
+    if media_type and not media:
+        message = query.message if query else update.message
+        await message.reply_text(MESSAGES["wrong_media"], parse_mode="Markdown")
+        return BROADCAST
+    
+    # Inform admin that broadcasting has started
+    message_text = MESSAGES["broadcast_started"]
+    if query:
+        status = await query.edit_message_text(message_text, parse_mode="Markdown")
+    else:
+        status = await update.message.reply_text(message_text, parse_mode="Markdown")
+    
+    # Send the message once to the admin's chat; every recipient gets a
+    # server-side copy of it instead of a fresh upload
+    admin_chat_id = update.effective_chat.id
+    try:
+        if media_type == "photo":
+            template = await context.bot.send_photo(admin_chat_id, photo=media, caption=text)
+        elif media_type == "video":
+            template = await context.bot.send_video(admin_chat_id, video=media, caption=text)
+        else:
+            template = await context.bot.send_message(admin_chat_id, text)
+    except TelegramError as e:
+        logger.error("Failed to send broadcast template: %s", e)
+        await status.edit_text(MESSAGES["broadcast_failed"], parse_mode="Markdown")
+        context.user_data.pop("draft", None)
+        return ConversationHandler.END
+    
+    # Every user except the admin, who already has the message
+    recipients = [user_id for user_id in users if user_id != admin_chat_id]
+    successful = len(users) - len(recipients)
+    failed = 0
+    
+    # Every recipient gets the same copy, so bind everything but the chat once
+    copy_template = functools.partial(
+        context.bot.copy_message, from_chat_id=admin_chat_id, message_id=template.message_id
+    )
+    
+    async def send_with_retry(user_id: int) -> None:
+        """Send to one user, retrying once after a timeout."""
+        # Flood control (RetryAfter) is paused and retried by the rate limiter
+        try:
+            await copy_template(user_id)
+        except TimedOut:
+            # The timed-out copy may already have been delivered, so this
+            # retry can occasionally send the user a duplicate
+            await asyncio.sleep(1)
+            await copy_template(user_id)
+    
+    semaphore = asyncio.Semaphore(BROADCAST_WORKERS)
+    
+    async def send_one(user_id: int) -> bool:
+        async with semaphore:
+            try:
+                await send_with_retry(user_id)
+                return True
+            except Exception as e:
+                logger.error("Failed to send message to user %s: %s", user_id, e)
+                return False
+    
+    total = successful + len(recipients)
+    
+    async def report_progress() -> None:
+        try:
+            await status.edit_text(
+                MESSAGES["broadcast_progress"].format(
+                    done=successful + failed, total=total, successful=successful, failed=failed
+                ),
+                parse_mode="Markdown"
+            )
+        except TelegramError as e:
+            logger.warning("Failed to update broadcast progress: %s", e)
+    
+    # Broadcast in waves, overlapping the network round-trips within each
+    # one; the application's rate limiter paces the actual requests
+    for chunk in chunks(recipients, BROADCAST_CHUNK_SIZE):
+        for sent in asyncio.as_completed([send_one(user_id) for user_id in chunk]):
+            if await sent:
+                successful += 1
+            else:
+                failed += 1
+            if (successful + failed) % BROADCAST_PROGRESS_INTERVAL == 0:
+                await report_progress()
+    
+    # Inform admin about broadcast results
+    result_text = MESSAGES["broadcast_done"].format(successful=successful, failed=failed)
+    
+    if query:
+        await query.message.reply_text(result_text, parse_mode="Markdown")
+    else:
+        await update.message.reply_text(result_text, parse_mode="Markdown")
+    
+    # Discard the draft
+    context.user_data.pop("draft", None)
+    return ConversationHandler.END
+
+# Media choice callbacks; "send_now" broadcasts without media
+MEDIA_HANDLERS = {
+    "add_photo": _prompt_photo,
+    "add_video": _prompt_video,
+    "send_now": broadcast_message,
+}
+
+async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Cancel conversation."""
+    await update.message.reply_text(
+        MESSAGES["cancelled"],
+        parse_mode="Markdown"
+    )
+    context.user_data.pop("draft", None)
+    return ConversationHandler.END
+
+def register(application: Application) -> None:
+    """Register all the handlers for the bot on the application."""
+    # Add handlers to application
+    application.add_handler(CommandHandler("start", start))
+    
+    # Add conversation handler for broadcasting. The callbacks that can start
+    # a broadcast don't block, so other updates keep being processed while
+    # it runs
+    conv_handler = ConversationHandler(
+        entry_points=[CallbackQueryHandler(button_callback, pattern="^broadcast$")],
+        states={
+            TYPING_TEXT: [MessageHandler(filters.TEXT & ~filters.COMMAND, text_input)],
+            WAITING_MEDIA: [CallbackQueryHandler(media_choice, block=False)],
+            BROADCAST: [
+                MessageHandler(filters.PHOTO | filters.VIDEO, receive_media),
+                CallbackQueryHandler(broadcast_message, pattern="^send_now$", block=False),
+            ],
+        },
+        fallbacks=[CommandHandler("cancel", cancel)],
+        name="broadcast",
+        persistent=True,
+    )
+    application.add_handler(conv_handler)